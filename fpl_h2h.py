@@ -1,13 +1,44 @@
 import argparse
+import csv
+import hashlib
 import json
 import os
-import re
-from http.server import SimpleHTTPRequestHandler, HTTPServer
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from collections import defaultdict
+from types import MappingProxyType
+from collections import Counter, defaultdict
+from functools import lru_cache
+from operator import itemgetter
 
 import requests
 import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json works the same, just slower
+    orjson = None
+
+if orjson is not None:
+    _loads = orjson.loads
+    def _dumps(obj, indent=True):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+else:
+    _loads = json.loads
+    def _dumps(obj, indent=True):
+        if indent:
+            return json.dumps(obj, indent=2).encode("utf-8")
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
 
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
@@ -17,15 +48,79 @@ ENTRY_HISTORY_URL = "https://fantasy.premierleague.com/api/entry/{entry_id}/hist
 PICKS_URL = "https://fantasy.premierleague.com/api/entry/{entry_id}/event/{gw}/picks/"
 LIVE_URL = "https://fantasy.premierleague.com/api/event/{gw}/live/"
 
-TOKEN_RE = re.compile(r"^(SEED[1-6]|WINNER_SF[12]|LOSER_SF[12]|WINNER_SHIELD_SF[12])$")
+# One keep-alive session shared by every fetch so TCP/TLS connections are reused
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "pml/1.0", "Accept-Encoding": "gzip"})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32, pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])))
+FETCH_WORKERS = 16
+
+# Raw API responses cached on disk; a past GW's payload is kept for good once fetched after it settled
+CACHE_DIR = DATA_DIR / "cache"
+HTTP_CACHE_DIR = CACHE_DIR / "http"
+HTTP_CACHE_TTL = 300  # seconds, for anything that can still move (current GW, entry history)
+# Machine-only checkpoints live beside the HTTP cache, out of git and out of the published site
+STANDINGS_STATE_PATH = CACHE_DIR / "standings_state.json"
+TOKEN_CACHE_PATH = CACHE_DIR / "token_cache.json"
 
 # -------------------------
 # Config & schedule loading
 # -------------------------
 
+# path -> ((mtime_ns, size), parsed); an entry is only reused while the file is unchanged on disk
+_JSON_CACHE = {}
+
+def load_json(p):
+    """Parse a JSON file, reusing the previous parse while the file is unchanged on disk."""
+    st = os.stat(p)
+    stamp = (st.st_mtime_ns, st.st_size)
+    hit = _JSON_CACHE.get(str(p))
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    data = _loads(Path(p).read_bytes())
+    _JSON_CACHE[str(p)] = (stamp, data)
+    return data
+
+def remember_json(p, obj):
+    """Seed the parse cache with obj just written to p, so this run never re-reads it from disk."""
+    st = os.stat(p)
+    _JSON_CACHE[str(p)] = ((st.st_mtime_ns, st.st_size), obj)
+
+def load_gw_results(gw):
+    """Parsed gw_<gw>_results.json, or None if that GW has not been computed yet."""
+    p = DATA_DIR / f"gw_{gw}_results.json"
+    return load_json(p) if p.exists() else None
+
+@lru_cache(maxsize=4)
+def _load_yaml(path_str, mtime_ns):
+    with open(path_str, "r") as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+def load_yaml(p):
+    """Parse a YAML file with the C loader when available, memoized by mtime."""
+    return _load_yaml(str(p), os.stat(p).st_mtime_ns)
+
+def write_bytes_atomic(p, data):
+    """Write via a sibling temp file + os.replace so readers never see a half-written file."""
+    p = Path(p)
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, p)
+
+def write_json(p, obj, indent=True):
+    """
+    Write obj as JSON, leaving the file (and its mtime) alone when the content is unchanged.
+    Files people or the site read are indented; pass indent=False for machine-only state.
+    """
+    data = _dumps(obj, indent)
+    p = Path(p)
+    if p.exists() and p.stat().st_size == len(data) and p.read_bytes() == data:
+        return
+    write_bytes_atomic(p, data)
+
 def load_config():
-    with open("config.yml", "r") as f:
-        cfg = yaml.safe_load(f)
+    cfg = load_yaml("config.yml")
     # label preference: team_name -> name
     id_to_label = {}
     entry_ids = []
@@ -34,7 +129,8 @@ def load_config():
         eid = int(m["entry_id"])
         id_to_label[eid] = label
         entry_ids.append(eid)
-    return cfg, id_to_label, entry_ids
+    # built once here and shared read-only with every stage of the run
+    return cfg, MappingProxyType(id_to_label), entry_ids
 
 def write_schedule_json(rows, id_to_label):
     out = []
@@ -45,65 +141,188 @@ def write_schedule_json(rows, id_to_label):
                 return id_to_label.get(x, str(x))
             return x  # token string
         out.append({"gw": r["gw"], "home_name": label(h), "away_name": label(a)})
-    with open(DATA_DIR / "schedule.json", "w") as f:
-        json.dump({"matches": out}, f, indent=2)
+    write_json(DATA_DIR / "schedule.json", {"matches": out})
 
 def load_schedule():
     """Loads schedule.csv which may contain Entry IDs (ints) or playoff tokens (strings)."""
     rows_raw = []
-    with open("schedule.csv", "r", newline="") as f:
-        for i, line in enumerate(f):
-            if i == 0 and line.lower().startswith("gw,"):
+    # utf-8-sig drops the BOM that spreadsheet exports put in front of the "gw" header
+    with open("schedule.csv", "r", newline="", encoding="utf-8-sig") as f:
+        for i, parts in enumerate(csv.reader(f)):
+            if i == 0 and parts and parts[0].strip().lower() == "gw":
                 continue
-            parts = [p.strip() for p in line.strip().split(",")]
-            if len(parts) != 3: 
+            if len(parts) != 3:
                 continue
-            gw, home, away = parts
-            def parse_side(s):
-                try:
-                    return int(s)
-                except:
-                    return s  # token string
-            rows_raw.append({"gw": int(gw), "home": parse_side(home), "away": parse_side(away)})
+            gw, home, away = (p.strip() for p in parts)
+            # entry ids are plain integers; anything else is a playoff token string
+            home = int(home) if home.lstrip("-").isdigit() else home
+            away = int(away) if away.lstrip("-").isdigit() else away
+            rows_raw.append({"gw": int(gw), "home": home, "away": away})
     return rows_raw
 
 # -------------------------
 # FPL points helpers
 # -------------------------
 
-def get_final_points(entry_id, gw):
-    # Official finalized points (after a GW ends)
-    url = ENTRY_HISTORY_URL.format(entry_id=entry_id)
-    r = requests.get(url, timeout=20)
+def fetch_json(url, expire_after=HTTP_CACHE_TTL):
+    """
+    GET url through SESSION, served from the on-disk cache while fresh.
+    expire_after=None means the payload has settled: a copy fetched under that rule is kept forever,
+    but one saved while it could still move (provisional points, pre-autosub picks) is revalidated first.
+    Stale entries are revalidated with If-None-Match/If-Modified-Since; a 304 reuses the cached body.
+    Each URL keeps its body in <sha1>.json and its validators in a <sha1>.meta.json sidecar.
+    """
+    key = hashlib.sha1(url.encode()).hexdigest()
+    path = HTTP_CACHE_DIR / f"{key}.json"
+    meta_path = HTTP_CACHE_DIR / f"{key}.meta.json"
+    settled = expire_after is None
+    meta = {}
+    headers = {}
+    if path.exists():
+        meta = load_json(meta_path) if meta_path.exists() else {}
+        fresh = meta.get("settled") if settled else time.time() - path.stat().st_mtime < expire_after
+        if fresh:
+            return load_json(path)
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = SESSION.get(url, headers=headers, timeout=20)
+    if r.status_code == 304:
+        # Take the cached parse before touching the file: utime changes its stamp
+        data = load_json(path)
+        os.utime(path)  # revalidated, so restart its TTL
+        remember_json(path, data)
+        if settled and not meta.get("settled"):
+            write_json(meta_path, {**meta, "url": url, "settled": True}, indent=False)
+        return data
     r.raise_for_status()
-    cur = r.json().get("current", [])
-    for item in cur:
+    # Decode the raw bytes once with the fast parser and keep that parse for later reads of the cache file
+    data = _loads(r.content)
+    HTTP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    write_bytes_atomic(path, r.content)
+    remember_json(path, data)
+
+    etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    if etag or last_modified or settled:
+        write_json(meta_path, {"url": url, "etag": etag, "last_modified": last_modified, "settled": settled},
+                   indent=False)
+    else:
+        meta_path.unlink(missing_ok=True)  # old validators belong to a different body
+    return data
+
+def _expire_after(gw, current_gw):
+    return None if current_gw is not None and gw < current_gw else HTTP_CACHE_TTL
+
+@lru_cache(maxsize=64)
+def _fetch_entry_history(entry_id, expire_after=HTTP_CACHE_TTL):
+    # One history payload carries every GW's points, so fetch it once per entry
+    url = ENTRY_HISTORY_URL.format(entry_id=entry_id)
+    return fetch_json(url, expire_after).get("current", [])
+
+_LIVE_LOCK = threading.Lock()
+
+@lru_cache(maxsize=64)
+def _fetch_live_elements(gw, expire_after=HTTP_CACHE_TTL):
+    """Map element id -> provisional total_points for a GW (same payload for every manager)."""
+    live_url = LIVE_URL.format(gw=gw)
+    live = fetch_json(live_url, expire_after).get("elements", [])
+    return {el.get("id"): el.get("stats", {}).get("total_points", 0) for el in live}
+
+def get_final_points(entry_id, gw, current_gw=None):
+    # Official finalized points (after a GW ends)
+    history = None
+    if current_gw is not None and gw < current_gw:
+        # A saved history that already lists a later GW has this one settled, however old the file is
+        history = _fetch_entry_history(entry_id, None)
+        if not any(item.get("event", 0) > gw for item in history):
+            history = None
+    if history is None:
+        history = _fetch_entry_history(entry_id)
+    for item in history:
         if item.get("event") == gw:
             return item.get("points", 0)
     return 0
 
-def get_live_points(entry_id, gw):
+def get_live_points(entry_id, gw, current_gw=None):
     # Provisional live score for current GW (captaincy via picks multipliers; bench/autosubs best effort)
+    expire_after = _expire_after(gw, current_gw)
     picks_url = PICKS_URL.format(entry_id=entry_id, gw=gw)
-    pr = requests.get(picks_url, timeout=20)
-    pr.raise_for_status()
-    picks = pr.json().get("picks", [])
+    picks = fetch_json(picks_url, expire_after).get("picks", [])
     elements = {p["element"]: p.get("multiplier", 0) for p in picks if p.get("multiplier", 0) > 0}
 
-    live_url = LIVE_URL.format(gw=gw)
-    lr = requests.get(live_url, timeout=20)
-    lr.raise_for_status()
-    live = lr.json().get("elements", [])
-    live_points = 0
-    for el in live:
-        el_id = el.get("id")
-        if el_id in elements:
-            pts = el.get("stats", {}).get("total_points", 0)
-            live_points += pts * elements[el_id]
-    return live_points
-
-def resolve_points(entry_id, gw, mode="final"):
-    return get_final_points(entry_id, gw) if mode == "final" else get_live_points(entry_id, gw)
+    # Single-flight the shared /live/ payload: concurrent workers wait for the first fetch
+    with _LIVE_LOCK:
+        live_elements = _fetch_live_elements(gw, expire_after)
+    return sum(live_elements.get(el_id, 0) * mult for el_id, mult in elements.items())
+
+@lru_cache(maxsize=1)
+def _bootstrap_events():
+    """bootstrap-static's events list (fetched once per run), or None if it could not be fetched."""
+    try:
+        return fetch_json(BOOTSTRAP_URL).get("events", [])
+    except Exception as e:
+        # Live mode then scores every GW through picks + /live/, and playoff tokens go uncached
+        print(f"warning: could not fetch bootstrap-static ({e}); FPL's current GW and season are unknown",
+              file=sys.stderr)
+        return None
+
+def fpl_current_gw():
+    """The GW FPL flags is_current in bootstrap-static, or None if unknown."""
+    for e in _bootstrap_events() or []:
+        if e.get("is_current"):
+            return e.get("id")
+    return None
+
+def fpl_season():
+    """The season's start year from GW1's deadline in bootstrap-static (e.g. "2025"), or None if unknown."""
+    events = _bootstrap_events()
+    deadline = events[0].get("deadline_time") if events else None
+    return deadline[:4] if deadline else None
+
+def resolve_points(entry_id, gw, mode="final", current_gw=None):
+    """
+    current_gw, when known, marks earlier GWs as settled so their responses are cached for good.
+    In live mode FPL's own current GW overrides it, since --gw can run ahead of FPL.
+    """
+    if mode != "final":
+        fpl_gw = fpl_current_gw()
+        if fpl_gw is not None:
+            current_gw = fpl_gw
+            # A GW FPL has already moved past has official points; skip the picks + live pair for it
+            if gw < fpl_gw:
+                mode = "final"
+    if mode == "final":
+        return get_final_points(entry_id, gw, current_gw)
+    return get_live_points(entry_id, gw, current_gw)
+
+def fetch_all(gw, entry_ids, mode="final", current_gw=None):
+    """
+    Fetch points for every entry in one GW with all requests in flight at once.
+    Returns ({entry_id: points}, {entry_id: exception}) so callers decide how to surface failures.
+    """
+    entry_ids = list(entry_ids)
+    points, errors = {}, {}
+    if mode != "final" and entry_ids:
+        # Warm the shared bootstrap and /live/ caches before fanning out to the workers
+        fpl_gw = fpl_current_gw()
+        if fpl_gw is not None:
+            current_gw = fpl_gw  # same settledness rule as resolve_points
+        if fpl_gw is None or gw >= fpl_gw:
+            try:
+                _fetch_live_elements(gw, _expire_after(gw, current_gw))
+            except Exception as e:
+                return points, {eid: e for eid in entry_ids}
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        futures = {ex.submit(resolve_points, eid, gw, mode, current_gw): eid for eid in entry_ids}
+        for fut in as_completed(futures):
+            eid = futures[fut]
+            try:
+                points[eid] = fut.result()
+            except Exception as e:
+                errors[eid] = e
+    return points, errors
 
 # -------------------------
 # Standings support
@@ -114,52 +333,111 @@ def load_standings_sorted():
     p = DATA_DIR / "standings.json"
     if not p.exists():
         return []
-    data = json.load(open(p))
+    data = load_json(p)
     return data.get("teams", [])
 
-def update_standings(cfg, schedule, upto_gw, id_to_label):
-    table = {
-        eid: {"entry_id": eid, "name": id_to_label[eid], "played": 0, "wins": 0, "draws": 0, "losses": 0,
-              "points_for": 0, "points_against": 0, "points": 0}
-        for eid in id_to_label.keys()
-    }
+STANDINGS_COLUMNS = ("played", "wins", "draws", "losses", "points_for", "points_against", "points")
 
-    for gw in range(1, upto_gw + 1):
-        path = DATA_DIR / f"gw_{gw}_results.json"
-        if not path.exists():
+def _standings_rows(id_to_label, cols):
+    return [
+        {"entry_id": eid, "name": id_to_label[eid], **{c: cols[c][i] for c in STANDINGS_COLUMNS}}
+        for i, eid in enumerate(id_to_label)
+    ]
+
+def _load_standings_state(id_to_label, upto_gw):
+    """Return (columns, last_gw) from the checkpoint if it still applies to this league, else None."""
+    p = STANDINGS_STATE_PATH
+    if not p.exists():
+        return None
+    state = load_json(p)
+    last_gw = state.get("last_gw", 0)
+    rows = {t["entry_id"]: t for t in state.get("teams", [])}
+    if last_gw >= upto_gw or set(rows) != set(id_to_label):
+        return None
+    cols = {c: [rows[eid][c] for eid in id_to_label] for c in STANDINGS_COLUMNS}
+    return cols, last_gw
+
+def _gw_is_final(results):
+    matches = results.get("matches", [])
+    return bool(matches) and all(m.get("status") == "final" for m in matches)
+
+def _aggregate(cols, h_idx, a_idx, hp_col, ap_col):
+    """Fold match columns (home/away slot, home/away points) into the standings columns in place."""
+    played, wins, draws, losses, pf, pa, pts = (cols[c] for c in STANDINGS_COLUMNS)
+    for h, a, hp, ap in zip(h_idx, a_idx, hp_col, ap_col):
+        pf[h] += hp
+        pa[h] += ap
+        pf[a] += ap
+        pa[a] += hp
+
+        played[h] += 1
+        played[a] += 1
+        if hp > ap:
+            wins[h] += 1
+            losses[a] += 1
+            pts[h] += 3
+        elif ap > hp:
+            wins[a] += 1
+            losses[h] += 1
+            pts[a] += 3
+        else:
+            draws[h] += 1
+            draws[a] += 1
+            pts[h] += 1
+            pts[a] += 1
+
+def update_standings(id_to_label, schedule, upto_gw, rebuild=False):
+    # One list per column indexed by manager slot, instead of a dict of dicts per manager
+    slot = {eid: i for i, eid in enumerate(id_to_label)}
+    cols = {c: [0] * len(slot) for c in STANDINGS_COLUMNS}
+    start_gw = 1
+
+    # Finalized GWs never change, so resume from the last checkpointed GW
+    state = None if rebuild else _load_standings_state(id_to_label, upto_gw)
+    if state:
+        cols, last_gw = state
+        start_gw = last_gw + 1
+    checkpoint_gw = start_gw - 1
+    final_prefix = True
+
+    gws = range(start_gw, upto_gw + 1)
+    parsed = [load_gw_results(gw) for gw in gws]
+
+    # Gather every match into flat columns, split into the part safe to checkpoint and the rest
+    settled = ([], [], [], [])
+    pending = ([], [], [], [])
+    for gw, results in zip(gws, parsed):
+        if results is None:
+            final_prefix = False
             continue
-        results = json.load(open(path))
+        # Only an unbroken run of final GWs before the one being processed is safe to
+        # checkpoint; live/pending GWs and the current GW (which may be recomputed) get refolded
+        final_prefix = final_prefix and _gw_is_final(results)
+        if final_prefix and gw < upto_gw:
+            batch, checkpoint_gw = settled, gw
+        else:
+            batch = pending
         for m in results.get("matches", []):
             if not (isinstance(m["home_entry_id"], int) and isinstance(m["away_entry_id"], int)):
                 continue  # skip pending token matches
-            h_id, a_id = m["home_entry_id"], m["away_entry_id"]
-            hp, ap = m["home_points"], m["away_points"]
-
-            table[h_id]["points_for"] += hp
-            table[h_id]["points_against"] += ap
-            table[a_id]["points_for"] += ap
-            table[a_id]["points_against"] += hp
-
-            table[h_id]["played"] += 1
-            table[a_id]["played"] += 1
-            if hp > ap:
-                table[h_id]["wins"] += 1
-                table[a_id]["losses"] += 1
-                table[h_id]["points"] += 3
-            elif ap > hp:
-                table[a_id]["wins"] += 1
-                table[h_id]["losses"] += 1
-                table[a_id]["points"] += 3
-            else:
-                table[h_id]["draws"] += 1
-                table[a_id]["draws"] += 1
-                table[h_id]["points"] += 1
-                table[a_id]["points"] += 1
-
-    teams = list(table.values())
-    teams.sort(key=lambda t: (t["points"], t["points_for"] - t["points_against"], t["points_for"]), reverse=True)
-    with open(DATA_DIR / "standings.json", "w") as f:
-        json.dump({"teams": teams}, f, indent=2)
+            batch[0].append(slot[m["home_entry_id"]])
+            batch[1].append(slot[m["away_entry_id"]])
+            batch[2].append(m["home_points"])
+            batch[3].append(m["away_points"])
+
+    _aggregate(cols, *settled)
+    checkpoint = ({c: list(v) for c, v in cols.items()}, checkpoint_gw)
+    _aggregate(cols, *pending)
+    pts, pf, pa = cols["points"], cols["points_for"], cols["points_against"]
+
+    CACHE_DIR.mkdir(exist_ok=True)
+    write_json(STANDINGS_STATE_PATH,
+               {"last_gw": checkpoint[1], "teams": _standings_rows(id_to_label, checkpoint[0])}, indent=False)
+    # Decorate rows with their (points, for - against, points_for) key read straight off the columns
+    keyed = list(zip(pts, [f - a for f, a in zip(pf, pa)], pf, _standings_rows(id_to_label, cols)))
+    keyed.sort(key=itemgetter(0, 1, 2), reverse=True)
+    teams = [k[3] for k in keyed]
+    write_json(DATA_DIR / "standings.json", {"teams": teams})
     return {"teams": teams}
 
 # -------------------------
@@ -175,112 +453,167 @@ def seed_map_from_standings(standings):
             seeds[f"SEED{i}"] = eid
     return seeds
 
-def resolve_token(side, standings):
-    """Resolve a single token to an entry_id if possible; else return token string."""
-    if isinstance(side, int):
-        return side
-    if not isinstance(side, str) or not TOKEN_RE.match(side):
-        return side
-
-    seeds = seed_map_from_standings(standings)
-
-    if side.startswith("SEED"):
-        return seeds.get(side, side)
-
-    # Semi ties live in GW31-32; Finals GW33-34; Shield SF GW35-36.
-    def collect_tie_legs(gw_list, candidates):
-        legs = []
-        for g in gw_list:
-            p = DATA_DIR / f"gw_{g}_results.json"
-            if not p.exists(): 
-                continue
-            data = json.load(open(p))
-            for m in data.get("matches", []):
-                s = {m["home_entry_id"], m["away_entry_id"]}
-                if all(c in s for c in candidates):
-                    legs.append(m)
-        return legs
-
-    if side in ("WINNER_SF1","LOSER_SF1"):
-        a, b = seeds.get("SEED1"), seeds.get("SEED4")
-        if a and b:
-            legs = collect_tie_legs([31,32], [a,b])
-            if len(legs) >= 2:
-                scores = {a:0, b:0}
-                for m in legs:
-                    scores[m["home_entry_id"]] += m["home_points"]
-                    scores[m["away_entry_id"]] += m["away_points"]
-                winner = a if scores[a] >= scores[b] else b
-                loser  = b if winner == a else a
-                return winner if side.startswith("WINNER") else loser
-        return side
-
-    if side in ("WINNER_SF2","LOSER_SF2"):
-        a, b = seeds.get("SEED2"), seeds.get("SEED3")
+@lru_cache(maxsize=8)
+def _build_legs_index(stamps):
+    index = defaultdict(list)
+    for gw, _mtime_ns, _size in stamps:
+        for m in load_gw_results(gw).get("matches", []):
+            index[frozenset((m["home_entry_id"], m["away_entry_id"]))].append(m)
+    return dict(index)
+
+def _gw_file_stamps(gws):
+    """[(gw, mtime_ns, size), ...] for the given GWs' results files that exist."""
+    stamps = []
+    for gw in gws:
+        p = DATA_DIR / f"gw_{gw}_results.json"
+        if p.exists():
+            st = p.stat()
+            stamps.append((gw, st.st_mtime_ns, st.st_size))
+    return stamps
+
+def legs_index(gws):
+    """{frozenset({home, away}): [match, ...]} over the given GWs' results, rebuilt only when a file changes."""
+    return _build_legs_index(tuple(_gw_file_stamps(gws)))
+
+def aggregate_tie(legs, a, b):
+    """Return (winner, loser) of a tie on aggregate points over its legs; level goes to a."""
+    scores = Counter()
+    for m in legs:
+        scores[m["home_entry_id"]] += m["home_points"]
+        scores[m["away_entry_id"]] += m["away_points"]
+    return (a, b) if scores[a] >= scores[b] else (b, a)
+
+def _load_token_cache():
+    p = TOKEN_CACHE_PATH
+    return {season: dict(tokens) for season, tokens in load_json(p).items()} if p.exists() else {}
+
+def _save_token_cache():
+    CACHE_DIR.mkdir(exist_ok=True)
+    write_json(TOKEN_CACHE_PATH, _TOKEN_CACHE, indent=False)
+
+# season -> token -> {"entry_id", "legs": [[gw, mtime_ns, size], ...]}; decided playoff ties are
+# persisted across runs, and an entry only holds while its leg files are untouched
+_TOKEN_CACHE = _load_token_cache()
+
+def _cache_tokens(gws, legs, resolved):
+    """Write-through resolved tokens, but only once every leg of the tie is final and the season is known."""
+    season = fpl_season()
+    if season is None or not all(m.get("status") == "final" for m in legs):
+        return
+    stamps = [list(s) for s in _gw_file_stamps(gws)]
+    tokens = _TOKEN_CACHE.setdefault(season, {})
+    for token, eid in resolved.items():
+        tokens[token] = {"entry_id": eid, "legs": stamps}
+    _save_token_cache()
+
+def _cached_token(side):
+    """The cached entry_id for side this season, or None (dropping the entry if its legs were rewritten)."""
+    tokens = _TOKEN_CACHE.get(fpl_season())
+    hit = tokens.get(side) if tokens else None
+    if hit is None:
+        return None
+    gws = [s[0] for s in hit["legs"]]
+    if [list(s) for s in _gw_file_stamps(gws)] != hit["legs"]:
+        del tokens[side]
+        _save_token_cache()
+        return None
+    return hit["entry_id"]
+
+def _seed_handler(side, seeds):
+    return seeds.get(side, side)
+
+def _sf_handler(seed_a, seed_b):
+    """Semi ties live in GW31-32: aggregate seed_a vs seed_b and resolve WINNER_/LOSER_ of that tie."""
+    def handler(side, seeds):
+        cached = _cached_token(side)
+        if cached is not None:
+            return cached
+        a, b = seeds.get(seed_a), seeds.get(seed_b)
         if a and b:
-            legs = collect_tie_legs([31,32], [a,b])
+            legs = legs_index((31, 32)).get(frozenset((a, b)), [])
             if len(legs) >= 2:
-                scores = {a:0, b:0}
-                for m in legs:
-                    scores[m["home_entry_id"]] += m["home_points"]
-                    scores[m["away_entry_id"]] += m["away_points"]
-                winner = a if scores[a] >= scores[b] else b
-                loser  = b if winner == a else a
+                winner, loser = aggregate_tie(legs, a, b)
+                tie = side[-3:]
+                _cache_tokens((31, 32), legs, {f"WINNER_{tie}": winner, f"LOSER_{tie}": loser})
                 return winner if side.startswith("WINNER") else loser
         return side
-
-    if side.startswith("WINNER_SHIELD_SF"):
-        # Read GW35-36 and pick SF1/SF2 winners in file order
-        g1 = DATA_DIR / "gw_35_results.json"
-        g2 = DATA_DIR / "gw_36_results.json"
-        ties = []
-        for p in (g1, g2):
-            if p.exists():
-                d = json.load(open(p))
-                for m in d.get("matches", []):
-                    key = tuple(sorted([m["home_entry_id"], m["away_entry_id"]], key=lambda x: (isinstance(x, str), x)))
-                    if key not in [t[0] for t in ties]:
-                        ties.append((key, []))
-        legs_by_key = {key: [] for key,_ in ties}
-        for p in (g1, g2):
-            if p.exists():
-                d = json.load(open(p))
-                for m in d.get("matches", []):
-                    key = tuple(sorted([m["home_entry_id"], m["away_entry_id"]], key=lambda x: (isinstance(x, str), x)))
-                    if key in legs_by_key:
-                        legs_by_key[key].append(m)
+    return handler
+
+def _shield_sf_handler(idx):
+    """Shield semis live in GW35-36; SF1/SF2 are the ties in file order."""
+    def handler(side, seeds):
+        cached = _cached_token(side)
+        if cached is not None:
+            return cached
+        # Read GW35-36 once (dicts keep insertion order)
+        legs_by_key = {}
+        for results in (load_gw_results(35), load_gw_results(36)):
+            if results is None:
+                continue
+            for m in results.get("matches", []):
+                key = tuple(sorted([m["home_entry_id"], m["away_entry_id"]], key=lambda x: (isinstance(x, str), x)))
+                legs_by_key.setdefault(key, []).append(m)
 
         keys = list(legs_by_key.keys())
         if len(keys) < 2:
             return side
-        idx = 0 if side.endswith("SF1") else 1
         legs = legs_by_key.get(keys[idx], [])
         if len(legs) >= 2 and all(isinstance(x, int) for x in keys[idx]):
-            a, b = keys[idx]
-            scores = {a:0, b:0}
-            for m in legs:
-                scores[m["home_entry_id"]] += m["home_points"]
-                scores[m["away_entry_id"]] += m["away_points"]
-            winner = a if scores[a] >= scores[b] else b
+            winner, _ = aggregate_tie(legs, *keys[idx])
+            _cache_tokens((35, 36), legs, {side: winner})
             return winner
         return side
+    return handler
+
+# token -> handler(side, seeds); also the set of valid playoff tokens
+TOKEN_HANDLERS = {
+    **{f"SEED{i}": _seed_handler for i in range(1, 7)},
+    "WINNER_SF1": _sf_handler("SEED1", "SEED4"),
+    "LOSER_SF1": _sf_handler("SEED1", "SEED4"),
+    "WINNER_SF2": _sf_handler("SEED2", "SEED3"),
+    "LOSER_SF2": _sf_handler("SEED2", "SEED3"),
+    "WINNER_SHIELD_SF1": _shield_sf_handler(0),
+    "WINNER_SHIELD_SF2": _shield_sf_handler(1),
+}
+
+def resolve_token(side, standings, seeds=None):
+    """
+    Resolve a single token to an entry_id if possible; else return token string.
+    Pass seeds (from seed_map_from_standings) when resolving many sides against the same standings.
+    """
+    if isinstance(side, int):
+        return side
+    handler = TOKEN_HANDLERS.get(side)
+    if handler is None:
+        return side
 
-    return side
+    if seeds is None:
+        seeds = seed_map_from_standings(standings)
+    return handler(side, seeds)
 
 # -------------------------
 # Core compute (per GW)
 # -------------------------
 
-def compute_results(cfg, schedule, gw, mode, id_to_label):
+def compute_results(id_to_label, schedule, gw, mode):
     standings = load_standings_sorted()
 
     # Resolve tokens for this GW
     matches = [m for m in schedule if m["gw"] == gw]
     out = {"gw": gw, "mode": mode, "matches": []}
 
+    seeds = seed_map_from_standings(standings)
+    resolved = []
     for m in matches:
-        h = resolve_token(m["home"], standings)
-        a = resolve_token(m["away"], standings)
+        h = resolve_token(m["home"], standings, seeds)
+        a = resolve_token(m["away"], standings, seeds)
+        resolved.append((h, a))
+
+    # Fetch every manager's points for this GW in one concurrent batch
+    entry_ids = {eid for pair in resolved for eid in pair if isinstance(eid, int)}
+    points, errors = fetch_all(gw, entry_ids, mode)
+
+    for h, a in resolved:
         h_name = id_to_label.get(h, str(h)) if isinstance(h, int) else str(h)
         a_name = id_to_label.get(a, str(a)) if isinstance(a, int) else str(a)
 
@@ -295,13 +628,13 @@ def compute_results(cfg, schedule, gw, mode, id_to_label):
             })
             continue
 
-        try:
-            hp = resolve_points(h, gw, mode)
-            ap = resolve_points(a, gw, mode)
+        err = errors.get(h) or errors.get(a)
+        if err is None:
+            hp, ap = points[h], points[a]
             status = "final" if mode == "final" else "live"
-        except Exception as e:
+        else:
             hp = ap = 0
-            status = f"pending ({e})"
+            status = f"pending ({err})"
 
         out["matches"].append({
             "home_entry_id": h, "home_name": h_name,
@@ -311,9 +644,10 @@ def compute_results(cfg, schedule, gw, mode, id_to_label):
             "status": status
         })
 
-    # Save GW results
-    with open(DATA_DIR / f"gw_{gw}_results.json", "w") as f:
-        json.dump(out, f, indent=2)
+    # Save GW results; later stages of this run read them straight from memory
+    path = DATA_DIR / f"gw_{gw}_results.json"
+    write_json(path, out)
+    remember_json(path, out)
 
     return out
 
@@ -325,32 +659,43 @@ def load_prizes():
     path = Path("prizes.yml")
     if not path.exists():
         return None
-    with open(path, "r") as f:
-        return yaml.safe_load(f)
-
-def get_all_entry_points_for_gw(entry_ids, gw, mode):
-    pts = {}
-    for eid in entry_ids:
-        try:
-            pts[eid] = resolve_points(eid, gw, mode)
-        except Exception:
-            pts[eid] = 0
-    return pts
-
-def calc_weekly_winners(entry_ids, upto_gw, mode, per_gw_amount):
+    return load_yaml(path)
+
+def get_all_entry_points_for_gw(entry_ids, gw, mode, current_gw=None):
+    points, _errors = fetch_all(gw, entry_ids, mode, current_gw)
+    # failed lookups count as 0, in entry order so ties are listed consistently
+    return {eid: points.get(eid, 0) for eid in entry_ids}
+
+def top_scorers(scores):
+    """Single pass over {entry_id: value}: (top value or 0 if empty, [entry_ids on it] in dict order)."""
+    best, top = 0, []
+    for eid, value in scores.items():
+        if not top or value > best:
+            best, top = value, [eid]
+        elif value == best:
+            top.append(eid)
+    return best, top
+
+def fetch_points_matrix(entry_ids, gw_start, gw_end, mode, current_gw=None):
+    """Fetch every entry's points for each GW once: { gw: { entry_id: points } }."""
+    return {gw: get_all_entry_points_for_gw(entry_ids, gw, mode, current_gw) for gw in range(gw_start, gw_end + 1)}
+
+def calc_weekly_winners(entry_ids, upto_gw, mode, per_gw_amount, points=None):
     """
+    points: optional matrix from fetch_points_matrix covering GW1..upto_gw (fetched if omitted).
     Returns:
       weekly: [ {gw, winners: [{entry_id, points, amount}], pot_per_gw} ... ]
       totals_by_entry: { entry_id: total_amount }
     """
     weekly = []
     totals = defaultdict(float)
+    if points is None:
+        points = fetch_points_matrix(entry_ids, 1, upto_gw, mode, upto_gw)
 
     for gw in range(1, upto_gw + 1):
         # Need valid results: rely on direct points calculation (doesn't depend on schedule)
-        pts = get_all_entry_points_for_gw(entry_ids, gw, mode)
-        max_pts = max(pts.values()) if pts else 0
-        winners = [eid for eid, p in pts.items() if p == max_pts]
+        pts = points[gw]
+        _, winners = top_scorers(pts)
         amount_each = round(per_gw_amount / max(1, len(winners)), 2) if per_gw_amount else 0.0
 
         week_row = {
@@ -364,25 +709,31 @@ def calc_weekly_winners(entry_ids, upto_gw, mode, per_gw_amount):
 
     return weekly, {eid: round(amt, 2) for eid, amt in totals.items()}
 
-def calc_block_points(entry_ids, gw_start, gw_end, mode):
+def calc_block_points(entry_ids, gw_start, gw_end, mode, current_gw=None, points=None):
     block_totals = defaultdict(int)
     best_single = defaultdict(int)
+    if points is None:
+        points = fetch_points_matrix(entry_ids, gw_start, gw_end, mode, current_gw)
     for gw in range(gw_start, gw_end + 1):
-        pts = get_all_entry_points_for_gw(entry_ids, gw, mode)
+        pts = points[gw]
         for eid, p in pts.items():
             block_totals[eid] += p
             if p > best_single[eid]:
                 best_single[eid] = p
     return block_totals, best_single
 
-def compute_mystery_kits(entry_ids, prizes_cfg, upto_gw, mode):
+def compute_mystery_kits(entry_ids, prizes_cfg, upto_gw, mode, points=None):
     """
     Reads blocks from prizes.yml and computes leader/winner per block.
+    points: optional matrix from fetch_points_matrix covering GW1..upto_gw.
     Returns dict suitable for data/mystery_kits.json
     """
     mk = prizes_cfg["allocations"]["mystery_kits"]
     blocks = mk.get("blocks", [])
     result_blocks = []
+    if points is None:
+        # one fetch for the whole season so far; each block then just sums its slice of the matrix
+        points = fetch_points_matrix(entry_ids, 1, upto_gw, mode, upto_gw)
 
     for idx, b in enumerate(blocks, start=1):
         s, e = int(b["gw_start"]), int(b["gw_end"])
@@ -390,12 +741,8 @@ def compute_mystery_kits(entry_ids, prizes_cfg, upto_gw, mode):
         status = "in_progress" if upto_gw < e else "complete"
         effective_end = min(upto_gw, e)
 
-        block_totals, best_single = calc_block_points(entry_ids, s, effective_end, mode)
-        if not block_totals:
-            leaders = []
-        else:
-            top_total = max(block_totals.values())
-            leaders = [eid for eid, tot in block_totals.items() if tot == top_total]
+        block_totals, best_single = calc_block_points(entry_ids, s, effective_end, mode, upto_gw, points)
+        top_total, leaders = top_scorers(block_totals)
 
         winner_eids = []
         tiebreak = None
@@ -406,8 +753,7 @@ def compute_mystery_kits(entry_ids, prizes_cfg, upto_gw, mode):
                 winner_eids = leaders
             else:
                 # tiebreaker 1: highest single-GW score in block
-                max_single = max(best_single[eid] for eid in leaders)
-                tb_leaders = [eid for eid in leaders if best_single[eid] == max_single]
+                _, tb_leaders = top_scorers({eid: best_single[eid] for eid in leaders})
                 if len(tb_leaders) == 1:
                     winner_eids = tb_leaders
                     tiebreak = "highest_single_gw_score_in_block"
@@ -423,7 +769,7 @@ def compute_mystery_kits(entry_ids, prizes_cfg, upto_gw, mode):
             "gw_start": s, "gw_end": e,
             "status": status,
             "leaders": [{"entry_id": eid, "total_points": block_totals.get(eid, 0), "best_single_gw": best_single.get(eid, 0)} for eid in sorted(block_totals.keys())],
-            "current_top_total": max(block_totals.values()) if block_totals else 0,
+            "current_top_total": top_total,
             "winners": winner_eids,
             "tiebreak_used": tiebreak,
             "note": note
@@ -443,10 +789,12 @@ def write_winnings_and_kits(cfg, id_to_label, entry_ids, upto_gw, mode):
     currency = (prizes.get("display") or {}).get("currency", "USD")
     per_gw = prizes["allocations"]["weekly_top_scorer"]["per_gw_amount"]
 
-    weekly_rows, totals_by_entry = calc_weekly_winners(entry_ids, upto_gw, mode, per_gw)
+    # Every GW's points are fetched once and shared by the weekly and block calculators
+    points = fetch_points_matrix(entry_ids, 1, upto_gw, mode, upto_gw)
+    weekly_rows, totals_by_entry = calc_weekly_winners(entry_ids, upto_gw, mode, per_gw, points)
 
     # Mystery kits
-    mk = compute_mystery_kits(entry_ids, prizes, upto_gw, mode)
+    mk = compute_mystery_kits(entry_ids, prizes, upto_gw, mode, points)
 
     # Build a per-team winnings/kit summary
     summary = []
@@ -468,11 +816,9 @@ def write_winnings_and_kits(cfg, id_to_label, entry_ids, upto_gw, mode):
         "weekly": weekly_rows,
         "totals": summary
     }
-    with open(DATA_DIR / "winnings.json", "w") as f:
-        json.dump(winnings_payload, f, indent=2)
+    write_json(DATA_DIR / "winnings.json", winnings_payload)
 
-    with open(DATA_DIR / "mystery_kits.json", "w") as f:
-        json.dump(mk, f, indent=2)
+    write_json(DATA_DIR / "mystery_kits.json", mk)
 
 # -------------------------
 # Tiny static server (optional)
@@ -480,9 +826,14 @@ def write_winnings_and_kits(cfg, id_to_label, entry_ids, upto_gw, mode):
 
 def serve():
     class Handler(SimpleHTTPRequestHandler):
-        pass
+        def end_headers(self):
+            # data files refresh at most every run; let browsers reuse them briefly
+            path = self.path.split("?", 1)[0]
+            if path.startswith("/data/") and path.endswith(".json"):
+                self.send_header("Cache-Control", "max-age=60")
+            super().end_headers()
     port = 8765
-    httpd = HTTPServer(("0.0.0.0", port), Handler)
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), Handler)
     print(f"Serving at http://127.0.0.1:{port}")
     httpd.serve_forever()
 
@@ -494,9 +845,14 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--gw", type=int, default=1, help="Gameweek number to process")
     parser.add_argument("--mode", choices=["live","final"], default="final", help="Use live or final points")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute standings and playoff ties from scratch, ignoring saved checkpoints")
     parser.add_argument("--serve", action="store_true", help="Serve a tiny website at http://127.0.0.1:8765")
     args = parser.parse_args()
 
+    if args.rebuild:
+        _TOKEN_CACHE.clear()
+        _save_token_cache()
+
     cfg, id_to_label, entry_ids = load_config()
     schedule = load_schedule()
     write_schedule_json(schedule, id_to_label)
@@ -506,8 +862,8 @@ def main():
         return
 
     # Compute this GW and update standings up to this GW
-    compute_results(cfg, schedule, args.gw, args.mode, id_to_label)
-    update_standings(cfg, schedule, args.gw, id_to_label)
+    compute_results(id_to_label, schedule, args.gw, args.mode)
+    update_standings(id_to_label, schedule, args.gw, rebuild=args.rebuild)
 
     # NEW: write winnings + mystery kits
     write_winnings_and_kits(cfg, id_to_label, entry_ids, args.gw, args.mode)